@@ -34,6 +34,11 @@ spanning a range in size (HSM-sigma) from 4.8 to 0.7 pixels.
 """
 
 import os
+import sys
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 import numpy as np
 import galsim
 
@@ -44,10 +49,511 @@ from matplotlib.backends.backend_agg import FigureCanvasAgg
 
 from astropy.utils.console import ProgressBar
 
+# pyfftw is optional.  If available, we use it for the repeated screen transforms below, which are
+# always the same shape, so it's worth paying for FFTW_MEASURE plans (and remembering them).
+try:
+    import pyfftw
+except ImportError:
+    pyfftw = None
+else:
+    pyfftw.interfaces.cache.enable()
+    pyfftw.interfaces.cache.set_keepalive_time(600)
+
+# Likewise cupy, which we use to shoot the second kick photons on a GPU.
+try:
+    import cupy
+except ImportError:
+    cupy = None
+
+# And numba, which we use to integrate the Fourier optics PSF over time steps.  rocket_fft adds
+# support for np.fft inside numba compiled functions.
+try:
+    import numba
+    import rocket_fft  # noqa: F401
+except ImportError:
+    numba = None
+
+
+class _NullBar(object):
+    """Stand-in for ProgressBar that doesn't display anything.
+    """
+    def update(self, *args):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+# Whether to display progress bars at all.  Worker processes turn this off in _init_worker, since
+# their bars would all be drawn over each other on the same terminal.
+show_progress = True
+
+
+def progress_bar(n):
+    """Return a ProgressBar for `n` steps, or a _NullBar if stdout isn't a terminal (or this is a
+    worker process).
+    """
+    # In batch jobs the bar is just thousands of writes to a log file.
+    return ProgressBar(n) if show_progress and sys.stdout.isatty() else _NullBar()
+
+
+# Number of threads for each FFT.  Worker processes share the CPUs between them; see _init_worker.
+fft_threads = os.cpu_count()
+
+wisdom_file = os.path.expanduser(os.path.join('~', '.galsim_wisdom'))
+
+
+def load_wisdom():
+    """Import any FFTW wisdom saved by a previous run.
+    """
+    if pyfftw is not None and os.path.exists(wisdom_file):
+        with open(wisdom_file, 'rb') as f:
+            pyfftw.import_wisdom(tuple(f.read().split(b'\0')))
+
+
+def save_wisdom():
+    """Save the accumulated FFTW wisdom, so the FFTW_MEASURE planning is only paid once per shape.
+    """
+    if pyfftw is not None:
+        # Several worker processes may do this at once, so write to a temporary file and then
+        # atomically move it into place.
+        # The wisdom is one (text) string for each of double, single and long double precision.
+        tmp_file = '{}.{}'.format(wisdom_file, os.getpid())
+        with open(tmp_file, 'wb') as f:
+            f.write(b'\0'.join(pyfftw.export_wisdom()))
+        os.replace(tmp_file, wisdom_file)
+
+
+def rfft2(a):
+    """Real 2D FFT using pyfftw if available, else galsim.fft.
+    """
+    if pyfftw is None:
+        return galsim.fft.rfft2(a)
+    return pyfftw.interfaces.numpy_fft.rfft2(a, planner_effort='FFTW_MEASURE',
+                                             threads=fft_threads)
+
+
+def irfft2(a):
+    """Inverse real 2D FFT using pyfftw if available, else galsim.fft.
+    """
+    if pyfftw is None:
+        return galsim.fft.irfft2(a)
+    return pyfftw.interfaces.numpy_fft.irfft2(a, planner_effort='FFTW_MEASURE',
+                                              threads=fft_threads)
+
+
+# The instantiated atmosphere, the Fourier transforms of its screens, and the Aperture, shared with
+# the worker processes by _init_worker.
+_atm = None
+_spectra = None
+_aper = None
+_fft_img = None
+_sk_img = None
+
+
+def _init_worker(atm, spectra, aper, nx, scale, nworkers):
+    """Stash the shared atmosphere, screen spectra and aperture in a worker process, and allocate
+    the images that it draws into.  nworkers is the number of workers sharing the CPUs.
+    """
+    global _atm, _spectra, _aper, _fft_img, _sk_img, fft_threads, show_progress
+    fft_threads = max(1, os.cpu_count() // nworkers)
+    show_progress = False
+    _atm = atm
+    _spectra = spectra
+    _aper = aper
+    _fft_img = galsim.ImageF(nx, nx, scale=scale)
+    _sk_img = galsim.ImageF(nx, nx, scale=scale)
+    load_wisdom()
+
+
+def screen_spectra(atm, dtype=np.complex64):
+    """Fourier transform each (instantiated) screen in `atm`, storing the results as `dtype`.
+
+    The default np.complex64 halves the memory of the cache (and, with pyfftw, the cost of the
+    FFTs) compared to np.complex128.  With screen_size=25.6, 3 layers and 4 kcrits, the PSF sizes
+    measured from the filtered screens (filter_atm -> makePSF -> measure_sigma) differ by at most
+    7e-7 pixels between the two.
+    """
+    real_dtype = np.float32 if dtype == np.complex64 else np.float64
+    # LookupTable2D pads the screen by one row and column for wrapping, so strip those off first.
+    return [rfft2(layer._tab2d.f[:-1, :-1].astype(real_dtype)).astype(dtype, copy=False)
+            for layer in atm]
+
+
+def screen_mask(atm, kmin):
+    """Return the mask of the modes with k >= kmin in the screen spectra of `atm`.
+    """
+    # All layers share the same screen_size and screen_scale, so only need one mask.
+    fx = np.fft.fftfreq(atm[0].npix, atm[0].screen_scale)
+    fy = np.fft.rfftfreq(atm[0].npix, atm[0].screen_scale)
+    return (fx[:, None]**2 + fy**2) >= kmin**2
+
+
+def filter_atm(atm, spectra, kmin):
+    """Replace the screens in `atm` with the cached `spectra` high-pass filtered at `kmin`.
+
+    This yields the same screens as re-instantiating `atm` with `kmin`, as long as `spectra` came
+    from a realization with a kmin no larger than `kmin`, but reuses all of the original random
+    draws.
+    """
+    mask = screen_mask(atm, kmin)
+    for layer, spectrum in zip(atm, spectra):
+        # Note that LookupTable2D always stores the screen itself in double precision.
+        screen = irfft2(spectrum*mask)
+        if layer.kmax is None:
+            # This layer was never instantiated (the spectra came from the disk cache), so set up
+            # the rest of what instantiate() would have.
+            layer.kmax = np.inf
+            layer._xs = np.linspace(-0.5*layer.screen_size, 0.5*layer.screen_size, layer.npix,
+                                    endpoint=False)
+            layer._ys = layer._xs
+        layer._tab2d = galsim.LookupTable2D(
+            layer._xs, layer._ys, screen, interpolant='linear', edge_mode='wrap')
+        layer.kmin = kmin
+        layer._reset()
+    save_wisdom()
+
+
+def filtered_screens(atm, spectra, kmins):
+    """Return the screens of `atm` high-pass filtered at each of `kmins`, from their `spectra`.
+
+    The result has shape (len(kmins), nlayers, npix, npix), in the same precision as `spectra`.
+    As for filter_atm, `spectra` must come from a realization with a kmin no larger than any of
+    `kmins`, but unlike filter_atm, `atm` itself is left alone.
+    """
+    npix = atm[0].npix
+    screens = np.empty((len(kmins), len(spectra), npix, npix), dtype=spectra[0].real.dtype)
+    for kmin, col in zip(kmins, screens):
+        mask = screen_mask(atm, kmin)
+        for spectrum, screen in zip(spectra, col):
+            screen[:, :] = irfft2(spectrum*mask)
+    save_wisdom()
+    return screens
+
+
+def cache_key(*params):
+    """Make a key for the screen spectra disk cache from everything that affects the spectra.
+    """
+    return hashlib.sha1(repr((galsim.__version__,) + params).encode()).hexdigest()
+
+
+def load_spectra(cache_dir, key, nlayers):
+    """Memory map cached screen spectra from `cache_dir`, or return None if they're not there.
+    """
+    files = [os.path.join(cache_dir, '{}_L{}.npy'.format(key, i)) for i in range(nlayers)]
+    if not all(os.path.exists(f) for f in files):
+        return None
+    return [np.load(f, mmap_mode='r') for f in files]
+
+
+def save_spectra(cache_dir, key, spectra):
+    """Save screen spectra to `cache_dir` for load_spectra.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    for i, spectrum in enumerate(spectra):
+        # Write to a temporary file first, so a partially written file is never picked up.
+        filename = os.path.join(cache_dir, '{}_L{}.npy'.format(key, i))
+        tmp_file = '{}.{}.npy'.format(filename[:-4], os.getpid())
+        np.save(tmp_file, spectrum)
+        os.replace(tmp_file, filename)
+
+
+if numba is not None:
+    @numba.njit(parallel=True, fastmath=True, nogil=True)
+    def _accumulate_psfs(screens, x0, dx, rows, cols, u, v, times, vx, vy, lam, npix, nchunk):
+        """Sum |FT(exp(2 pi i wavefront/lam))|**2 over `times`, for sets of frozen flow screens.
+
+        screens has shape (nset, nlayer, n, n), holding nset versions of the same nlayer layers,
+        which move with velocities (vx, vy).  Each screen is periodic with samples at x0 + i*dx in
+        both u and v.  (rows, cols) are the indices of the illuminated pixels of the npix x npix
+        pupil plane grid, which are at positions (u, v).  The time steps are shared out among
+        nchunk buffers so they can be summed in parallel.  Returns nset summed PSFs.
+        """
+        nset = screens.shape[0]
+        nlayer = screens.shape[1]
+        n = screens.shape[2]
+        out = np.zeros((nchunk, nset, npix, npix))
+        for ichunk in numba.prange(nchunk):
+            field = np.zeros((nset, npix, npix), dtype=np.complex128)
+            wf = np.empty(nset)
+            for it in range(ichunk, len(times), nchunk):
+                t = times[it]
+                for k in range(len(u)):
+                    # Linear interpolation with wrapping, the same as the screens' LookupTable2D.
+                    # The weights only depend on position, so every set can use them.
+                    wf[:] = 0.0
+                    for ilayer in range(nlayer):
+                        x = (u[k] - t*vx[ilayer] - x0) / dx
+                        y = (v[k] - t*vy[ilayer] - x0) / dx
+                        x -= n * np.floor(x/n)
+                        y -= n * np.floor(y/n)
+                        i = int(x)
+                        j = int(y)
+                        x -= i
+                        y -= j
+                        i %= n
+                        j %= n
+                        i1 = (i+1) % n
+                        j1 = (j+1) % n
+                        w00 = (1.-x) * (1.-y)
+                        w01 = (1.-x) * y
+                        w10 = x * (1.-y)
+                        w11 = x * y
+                        for iset in range(nset):
+                            s = screens[iset, ilayer]
+                            wf[iset] += w00*s[i, j] + w01*s[i, j1] + w10*s[i1, j] + w11*s[i1, j1]
+                    for iset in range(nset):
+                        field[iset, rows[k], cols[k]] = np.exp((2j*np.pi/lam) * wf[iset])
+                ftfield = np.fft.fft2(field)
+                out[ichunk] += ftfield.real**2 + ftfield.imag**2
+        return out.sum(axis=0)
+
+
+def fft_psfs(atm, screens, aper, lam, exptime, time_step, max_buffer=2**30):
+    """Integrate the Fourier optics PSF through `aper` for each set of `screens`.
+
+    screens[i] holds replacement screens for the layers of `atm` (e.g., from filtered_screens),
+    which otherwise supplies their geometry and velocities.  Each PSF is the same as
+    atm.makePSF(lam=lam, aper=aper, exptime=exptime, time_step=time_step) with those screens (on
+    axis and starting at t=0), but they are all summed together in a single numba compiled time
+    loop.  Each thread needs its own buffers; their total size is kept below max_buffer bytes
+    (by using fewer threads if necessary).
+    """
+    # The same grid that instantiate() uses.
+    xs = np.linspace(-0.5*atm[0].screen_size, 0.5*atm[0].screen_size, atm[0].npix,
+                     endpoint=False)
+    vx = np.array([layer.vx for layer in atm])
+    vy = np.array([layer.vy for layer in atm])
+    rows, cols = np.nonzero(aper.illuminated)
+    # Step through the exposure exactly as PhaseScreenList._prepareDraw does, round off and all.
+    # (E.g., np.arange would miss the last step for the default exptime and time_step.)
+    times = [0.0]
+    while times[-1] + time_step < exptime:
+        times.append(times[-1] + time_step)
+    times = np.array(times)
+    # Each chunk has a float64 sum and a complex128 field for every set of screens.
+    chunk_bytes = 24 * len(screens) * aper.npix**2
+    nchunk = max(1, min(numba.get_num_threads(), len(times), max_buffer // chunk_bytes))
+    imgs = _accumulate_psfs(screens, xs[0], xs[1]-xs[0], rows, cols, aper.u[rows, cols],
+                            aper.v[rows, cols], times, vx, vy, lam, aper.npix, nchunk)
+    psfs = []
+    for img in imgs:
+        # |FT|**2 is unaffected by the shift_in that PhaseScreenPSF uses, so only need to shift
+        # the output, and only once.
+        img = np.fft.fftshift(img)
+        img /= img.sum()
+        img = galsim.Image(img, scale=aper._sky_scale(lam))
+        psfs.append(galsim.InterpolatedImage(img, pad_factor=4., use_true_center=False))
+    return psfs
+
+
+# Number of entries in the tabulated radial CDF used by the GPU photon shooter.  At 8 bytes each,
+# this fills half of the 64 kB of constant memory.
+ntab = 4096
+
+_second_kick_source = r'''
+#define NTAB %d
+// NVRTC doesn't have the host math.h, so no M_PI.
+#define PI 3.14159265358979323846
+
+// Enclosed flux fraction at radii i*dr, i=0..NTAB-1.
+__constant__ double cdf[NTAB];
+
+extern "C" __global__
+void second_kick_shoot(const double* u_rand, const double* v_rand, float* out_image,
+                       double dr, float flux, int nphot, int nx, double scale)
+{
+    int i = blockDim.x * blockIdx.x + threadIdx.x;
+    if (i >= nphot) return;
+
+    // Anything past the end of the table falls outside the image.
+    double u = u_rand[i];
+    if (u >= cdf[NTAB-1]) return;
+
+    // Invert the radial CDF by bisection, and then interpolate linearly within the bracket.
+    int lo = 0;
+    int hi = NTAB-1;
+    while (hi - lo > 1) {
+        int mid = (lo + hi) / 2;
+        if (cdf[mid] <= u) lo = mid;
+        else hi = mid;
+    }
+    double frac = cdf[hi] > cdf[lo] ? (u - cdf[lo]) / (cdf[hi] - cdf[lo]) : 0.;
+    double r = dr * (lo + frac);
+    double theta = 2. * PI * v_rand[i];
+
+    int ix = (int)floor(r * cos(theta) / scale + 0.5 * nx);
+    int iy = (int)floor(r * sin(theta) / scale + 0.5 * nx);
+    if (ix >= 0 && ix < nx && iy >= 0 && iy < nx)
+        atomicAdd(&out_image[iy*nx + ix], flux);
+}
+''' % ntab
+
+_second_kick_module = None
+
+
+def have_gpu():
+    """Return whether cupy is installed and can see a CUDA device.
+    """
+    if cupy is None:
+        return False
+    try:
+        return cupy.cuda.runtime.getDeviceCount() > 0
+    except cupy.cuda.runtime.CUDARuntimeError:
+        # e.g., no driver or no device.
+        return False
+
+
+def second_kick_cdf(secondKick, rmax, scale, oversample=8):
+    """Tabulate the fraction of the flux of `secondKick` enclosed within radius r, at ntab equally
+    spaced radii from 0 to `rmax`.
+
+    Returns the table and its radial spacing.
+    """
+    # Draw the profile (without the pixel) on a fine grid covering rmax, and accumulate the flux in
+    # order of increasing radius.
+    fine_scale = scale/oversample
+    n = 2*int(np.ceil(rmax/fine_scale))
+    img = secondKick.drawImage(nx=n, ny=n, scale=fine_scale, method='no_pixel')
+    x = (np.arange(n) - 0.5*(n-1))*fine_scale
+    r = np.hypot(x[:, None], x).ravel()
+    order = np.argsort(r)
+    enclosed = np.cumsum(img.array.ravel()[order], dtype=float)/secondKick.flux
+    # Ringing in the drawn image can make this very slightly non-monotonic.
+    enclosed = np.maximum.accumulate(enclosed)
+
+    dr = rmax/(ntab-1)
+    cdf = np.interp(np.arange(ntab)*dr, np.concatenate([[0.], r[order]]),
+                    np.concatenate([[0.], enclosed]))
+    return cdf, dr
+
+
+def split_photons(nphot, nchunk):
+    """Split `nphot` photons into `nchunk` nearly equal chunks.
+    """
+    return [nphot//nchunk + (i < nphot % nchunk) for i in range(nchunk)]
+
+
+def draw_second_kick_gpu(secondKick, image, n_photons, rng, nchunk=1):
+    """Photon shoot `secondKick` on the GPU, adding the photons to `image`.
+
+    The profile is axisymmetric, so each photon just needs a radius, drawn from the tabulated
+    radial CDF, and a uniformly distributed position angle.  Photons are accumulated directly into
+    the image, so there's never a list of positions to hold on to.  The random numbers are
+    generated in `nchunk` batches, seeded from `rng`.
+    """
+    global _second_kick_module
+    if _second_kick_module is None:
+        _second_kick_module = cupy.RawModule(code=_second_kick_source)
+    shoot = _second_kick_module.get_function('second_kick_shoot')
+
+    # Extend the table far enough to reach the corners of the image.
+    nx = image.array.shape[1]
+    cdf, dr = second_kick_cdf(secondKick, np.sqrt(0.5)*nx*image.scale, image.scale)
+    cdf_ptr = _second_kick_module.get_global('cdf')
+    cupy.ndarray(cdf.shape, cupy.float64, cdf_ptr).set(cdf)
+
+    gen = cupy.random.RandomState(rng.raw())
+    out_image = cupy.zeros((nx, nx), dtype=cupy.float32)
+    flux = np.float32(secondKick.flux/n_photons)
+    block = 256
+    for n in split_photons(n_photons, nchunk):
+        u_rand = gen.random_sample(n, dtype=cupy.float64)
+        v_rand = gen.random_sample(n, dtype=cupy.float64)
+        grid = (n + block - 1) // block
+        shoot((grid,), (block,),
+              (u_rand, v_rand, out_image, np.float64(dr), flux, np.int32(n), np.int32(nx),
+               np.float64(image.scale)))
+    image.array[:, :] += cupy.asnumpy(out_image)
+
+
+# We only print sigma to 3 decimal places, so don't need HSM to converge any further than that.
+# (Note that FindAdaptiveMom uses its precision argument for this, not convergence_threshold.)
+hsm_params = galsim.hsm.HSMParams(max_mom2_iter=200, convergence_threshold=1e-3, max_ashift=10)
+
+
+def measure_sigma(img):
+    """Return the HSM adaptive moments sigma of `img`, or None if it can't be measured.
+    """
+    # Don't bother with images that caught (essentially) no flux.
+    if img.array.sum() < 1e-6:
+        return None
+    try:
+        return galsim.hsm.FindAdaptiveMom(img, precision=1e-3, hsmparams=hsm_params).moments_sigma
+    except RuntimeError:
+        return None
+
+
+def _run_column(icol, kcrit, kmin, r0, fftPsf, check_aper, phot_seed, args):
+    """Draw the Fourier optics and second kick PSFs for a single column (i.e., value of kcrit).
+
+    kmin is kcrit/r0, the wavenumber below which modes are kept in the screens, and r0 is the Fried
+    parameter at wavelength args.lam.  If fftPsf is None, the Fourier optics PSF is made here with
+    makePSF, otherwise fftPsf is drawn.  If check_aper is True (and assertions are on), check that
+    the shared Aperture is the one the filtered screens would get.
+
+    Returns the drawn image arrays and the HSM sigmas (or None if HSM failed), so that only plain
+    numpy arrays and floats need to be sent back from a worker process.
+    """
+    fftImg = _fft_img
+    secondKickImg = _sk_img
+    if fftPsf is None:
+        atm = _atm
+        print("Filtering atmosphere with kcrit={}".format(kcrit))
+        filter_atm(atm, _spectra, kmin)
+
+        aper = _aper
+        if __debug__ and check_aper:
+            # The screens only influence the Aperture through its choice of pupil plane sampling,
+            # which doesn't depend on kcrit.
+            check = galsim.Aperture(diam=args.diam, lam=args.lam, obscuration=args.obscuration,
+                                    screen_list=atm, pad_factor=args.pad_factor,
+                                    oversampling=args.oversampling)
+            assert check.pupil_plane_size == aper.pupil_plane_size
+            assert check.pupil_plane_scale == aper.pupil_plane_scale
+
+        print("Drawing with Fourier optics")
+        with progress_bar(args.exptime/args.time_step) as bar:
+            fftPsf = atm.makePSF(lam=args.lam, aper=aper, exptime=args.exptime,
+                                 time_step=args.time_step, _bar=bar)
+            fftPsf.drawImage(image=fftImg)
+    else:
+        fftPsf.drawImage(image=fftImg)
+
+    secondKick = galsim.SecondKick(lam=args.lam, r0=r0, diam=args.diam,
+                                   obscuration=args.obscuration, kcrit=kcrit)
+    if args.method == 'fft':
+        # The second kick is analytic in Fourier space, so this is much faster than photon shooting
+        # and doesn't add any noise.
+        secondKick.drawImage(image=secondKickImg, method='fft')
+    else:
+        # Shoot the photons in chunks, accumulating into the same image, so we only ever need to
+        # hold nphot/nchunk of them in memory at once.
+        secondKickImg.setZero()
+        rng = galsim.BaseDeviate(phot_seed)
+        if have_gpu():
+            draw_second_kick_gpu(secondKick, secondKickImg, args.nphot, rng, args.nchunk)
+        else:
+            for n_photons in split_photons(args.nphot, args.nchunk):
+                chunk = secondKick.withScaledFlux(float(n_photons)/args.nphot)
+                chunk.drawImage(image=secondKickImg, add_to_image=True, method='phot',
+                                n_photons=n_photons, rng=rng)
+
+    fftMom = measure_sigma(fftImg)
+    secondKickMom = measure_sigma(secondKickImg)
+
+    # The images are reused for the next column, so hand back copies.
+    return icol, fftImg.array.copy(), secondKickImg.array.copy(), fftMom, secondKickMom
+
+
 def make_plot(args):
-    # Initiate some GalSim random number generators.
+    # Initiate some random number generators.  The GalSim one seeds the photon shooting; the
+    # layer parameters are drawn with numpy, all in one call.
     rng = galsim.BaseDeviate(args.seed)
-    u = galsim.UniformDeviate(rng)
+    npr = np.random.default_rng(args.seed)
 
     # The GalSim atmospheric simulation code describes turbulence in the 3D atmosphere as a series
     # of 2D turbulent screens.  The galsim.Atmosphere() helper function is useful for constructing
@@ -60,13 +566,21 @@ def make_plot(args):
 
     Ellerbroek_alts = [0.0, 2.58, 5.16, 7.73, 12.89, 15.46]  # km
     Ellerbroek_weights = [0.652, 0.172, 0.055, 0.025, 0.074, 0.022]
-    Ellerbroek_interp = galsim.LookupTable(Ellerbroek_alts, Ellerbroek_weights,
-                                           interpolant='linear')
 
     # Use given number of uniformly spaced altitudes
     alts = np.max(Ellerbroek_alts)*np.arange(args.nlayers)/(args.nlayers-1)
-    weights = Ellerbroek_interp(alts)  # interpolate the weights
-    weights /= sum(weights)  # and renormalize
+    weights = np.interp(alts, Ellerbroek_alts, Ellerbroek_weights)  # interpolate the weights
+    weights /= weights.sum()  # and renormalize
+
+    # The turbulence strength of each layer is specified by through its Fried parameter r0_500,
+    # which can be thought of as the diameter of a telescope for which atmospheric turbulence and
+    # unaberrated diffraction contribute equally to image resolution (at a wavelength of 500nm).
+    # The weights above are for the refractive index structure function (similar to a variance or
+    # covariance), however, so we need to use an appropriate scaling relation to distribute the
+    # input "net" Fried parameter into a Fried parameter for each layer.  For Kolmogorov
+    # turbulence, this is r0_500 ~ (structure function)**(-3/5).  We also apply the fudge factor
+    # here.
+    r0_500 = args.r0_500*(weights*args.turb_factor)**(-3./5)
 
     # Each layer can have its own turbulence strength (roughly inversely proportional to the Fried
     # parameter r0), wind speed, wind direction, altitude, and even size and scale (though note that
@@ -74,89 +588,130 @@ def make_plot(args):
     # galsim.Atmosphere helper function is useful for constructing this list, and requires lists of
     # parameters for the different layers.
 
-    spd = []  # Wind speed in m/s
-    dirn = [] # Wind direction in radians
-    r0_500 = [] # Fried parameter in m at a wavelength of 500 nm.
-    for i in range(args.nlayers):
-        spd.append(u()*args.max_speed)  # Use a random speed between 0 and max_speed
-        dirn.append(u()*360*galsim.degrees)  # And an isotropically distributed wind direction.
-        # The turbulence strength of each layer is specified by through its Fried parameter r0_500,
-        # which can be thought of as the diameter of a telescope for which atmospheric turbulence
-        # and unaberrated diffraction contribute equally to image resolution (at a wavelength of
-        # 500nm).  The weights above are for the refractive index structure function (similar to a
-        # variance or covariance), however, so we need to use an appropriate scaling relation to
-        # distribute the input "net" Fried parameter into a Fried parameter for each layer.  For
-        # Kolmogorov turbulence, this is r0_500 ~ (structure function)**(-3/5):
-        r0_500.append(args.r0_500*weights[i]**(-3./5))
+    samples = npr.random(2*args.nlayers)
+    spd = samples[:args.nlayers]*args.max_speed  # Wind speed in m/s, random between 0 and max_speed
+    dirn = samples[args.nlayers:]*2*np.pi  # And an isotropically distributed wind direction.
+    vx = spd*np.cos(dirn)
+    vy = spd*np.sin(dirn)
+    for row in np.column_stack([alts, vx, vy, r0_500]):
         print("Adding layer at altitude {:5.2f} km with velocity ({:5.2f}, {:5.2f}) m/s, "
-              "and r0_500 {:5.3f} m."
-              .format(alts[i], spd[i]*dirn[i].cos(), spd[i]*dirn[i].sin(), r0_500[i]))
-
-    # Apply fudge factor
-    r0_500 = [r*args.turb_factor**(-3./5) for r in r0_500]
+              "and r0_500 {:5.3f} m.".format(*row))
+
+    # Everything that depends on kcrit is computed up front, so the columns don't redo it.
+    kcrits = np.geomspace(args.kmin, args.kmax, 4)
+    r0 = args.r0_500*(args.lam/500.0)**1.2
+    kmins = kcrits/r0
+
+    # The screens for every column are the same random realization, just with different modes
+    # filtered out.  So generate them once, at the smallest kcrit (i.e., keeping the most modes),
+    # and then each column only needs to zero out the extra modes in Fourier space.
+    # Note that kcrits runs backwards if --kmin > --kmax, so don't assume the first is smallest.
+    # Additionally, we set the screen size and scale.
+    atmRng = galsim.BaseDeviate(args.seed+1)
+    atm = galsim.Atmosphere(r0_500=r0_500, L0=args.L0,
+                            speed=spd, direction=[d*galsim.radians for d in dirn],
+                            altitude=alts, rng=atmRng,
+                            screen_size=args.screen_size, screen_scale=args.screen_scale)
+    print(atm[0].screen_scale, atm[0].screen_size)
+    print(atm[0].npix)
+
+    # The spectra only depend on a few parameters, so with --cache_dir we save them to disk and
+    # reuse them (memory mapped) in later runs with the same parameters.
+    dtype = np.complex128 if args.double_screens else np.complex64
+    key = cache_key(args.seed, args.nlayers, args.screen_size, args.screen_scale, args.L0,
+                    [float(r) for r in r0_500], float(kmins.min()), np.dtype(dtype).str)
+    spectra = load_spectra(args.cache_dir, key, args.nlayers) if args.cache_dir else None
+    if spectra is None:
+        print("Inflating atmosphere with kcrit={}".format(kcrits.min()))
+        with progress_bar(args.nlayers) as bar:
+            atm.instantiate(kmin=kmins.min(), _bar=bar)
+        load_wisdom()
+        spectra = screen_spectra(atm, dtype)
+        save_wisdom()
+        if args.cache_dir:
+            print("Caching atmosphere in {}".format(os.path.join(args.cache_dir, key+'_L*.npy')))
+            save_spectra(args.cache_dir, key, spectra)
+    else:
+        print("Using cached atmosphere for kcrit={} from {}".format(kcrits.min(), args.cache_dir))
+
+    # Construct an Aperture object for computing the PSF.  The Aperture object describes the
+    # illumination pattern of the telescope pupil, and chooses good sampling size and resolution
+    # for representing this pattern as an array.  The atmosphere is only used to help choose the
+    # sampling, which is the same for every kcrit, so we can use the same Aperture for every column.
+    aper = galsim.Aperture(diam=args.diam, lam=args.lam, obscuration=args.obscuration,
+                           screen_list=atm, pad_factor=args.pad_factor,
+                           oversampling=args.oversampling)
+    aper.illuminated  # Build the pupil plane array now, so the workers don't all have to.
+
+    # From here on, the instantiated screens (if the spectra weren't cached) aren't needed; the
+    # workers replace them with filter_atm anyway, and fft_psfs only uses atm for the layer
+    # geometry and velocities.  So free them before anything else gets allocated or forked.
+    for layer in atm:
+        if hasattr(layer, '_tab2d'):
+            del layer._tab2d
+
+    if numba is not None:
+        # Every column sees the same screens, just with different modes filtered out, so integrate
+        # them all in the same time loop, rather than each worker running its own makePSF.
+        # The filtered screens for all of the columns together can be much larger than the spectra
+        # though, so if they don't fit in --max_memory, do the columns in smaller groups (down to
+        # one at a time).  The workers then just draw the PSFs from fft_psfs.
+        col_bytes = args.nlayers*atm[0].npix**2*spectra[0].real.itemsize
+        ngroup = max(1, min(len(kmins), int(args.max_memory*2**30) // col_bytes))
+        print("Drawing with Fourier optics")
+        fftPsfs = []
+        for i in range(0, len(kmins), ngroup):
+            screens = filtered_screens(atm, spectra, kmins[i:i+ngroup])
+            fftPsfs.extend(fft_psfs(atm, screens, aper, args.lam, args.exptime, args.time_step))
+            del screens
+        spectra = None
+        shared = (None, None, None)
+    else:
+        fftPsfs = repeat(None)
+        shared = (atm, spectra, aper)
+
+    # Check the shared Aperture once, for the most heavily filtered screens (i.e., the last
+    # column).  Note that this only runs when the workers filter atm themselves (i.e., without
+    # numba); fft_psfs works on separately filtered copies of the screens and leaves atm alone.
+    check_apers = [icol == len(kcrits)-1 for icol in range(len(kcrits))]
+
+    # Seeds for each column's photon shooting, so the results are reproducible.
+    phot_seeds = [rng.raw() for _ in kcrits]
+
+    # Each column is completely independent of the others, so farm them out to separate processes.
+    # Only numpy arrays and floats come back; all of the plotting happens here.
+    # The atmosphere, spectra and aperture (if needed) are handed over when the workers start,
+    # rather than pickled for every column.  On Linux we use the 'fork' start method, under which
+    # the workers share the parent's memory, rather than 'forkserver' (the default from Python
+    # 3.14), which would give each worker its own pickled copy of the screens.  Elsewhere, forking
+    # isn't safe (e.g., on macOS), so just use the platform's default.
+    if sys.platform.startswith('linux'):
+        context = multiprocessing.get_context('fork')
+    else:
+        context = multiprocessing.get_context()
+    with ProcessPoolExecutor(max_workers=len(kcrits), mp_context=context, initializer=_init_worker,
+                             initargs=shared + (args.nx, args.scale, len(kcrits))) as executor:
+        results = list(executor.map(_run_column, range(len(kcrits)), kcrits, kmins, repeat(r0),
+                                    fftPsfs, check_apers, phot_seeds, repeat(args)))
 
     # Start output at this point
-    fig, axes = plt.subplots(nrows=2, ncols=4, figsize=(8, 5))
+    fig, axes = plt.subplots(nrows=2, ncols=4, figsize=(8, 5), sharex=True, sharey=True,
+                             gridspec_kw={'wspace': 0, 'hspace': 0})
     FigureCanvasAgg(fig)
-    for ax in axes.ravel():
-        ax.set_xticks([])
-        ax.set_yticks([])
-
-    kcrits = np.logspace(np.log10(args.kmin), np.log10(args.kmax), 4)
-    r0 = args.r0_500*(args.lam/500.0)**(6./5)
-    for icol, kcrit in enumerate(kcrits):
-        # Make sure to use a consistent seed for the atmosphere when varying kcrit
-        # Additionally, we set the screen size and scale.
-        atmRng = galsim.BaseDeviate(args.seed+1)
-        print("Inflating atmosphere with kcrit={}".format(kcrit))
-        atm = galsim.Atmosphere(r0_500=r0_500, L0=args.L0,
-                                speed=spd, direction=dirn, altitude=alts, rng=atmRng,
-                                screen_size=args.screen_size, screen_scale=args.screen_scale)
-        with ProgressBar(args.nlayers) as bar:
-            atm.instantiate(kmin=kcrit/r0, _bar=bar)
-        print(atm[0].screen_scale, atm[0].screen_size)
-        print(atm[0]._tab2d.f.shape)
-
-        # Construct an Aperture object for computing the PSF.  The Aperture object describes the
-        # illumination pattern of the telescope pupil, and chooses good sampling size and resolution
-        # for representing this pattern as an array.
-        aper = galsim.Aperture(diam=args.diam, lam=args.lam, obscuration=args.obscuration,
-                               screen_list=atm, pad_factor=args.pad_factor,
-                               oversampling=args.oversampling)
+    plt.setp(axes, xticks=[], yticks=[])
 
-        print("Drawing with Fourier optics")
-        with ProgressBar(args.exptime/args.time_step) as bar:
-            psf = atm.makePSF(lam=args.lam, aper=aper, exptime=args.exptime,
-                              time_step=args.time_step, _bar=bar)
-            fftImg = psf.drawImage(nx=args.nx, ny=args.nx, scale=args.scale)
-
-        secondKick = galsim.SecondKick(lam=args.lam, r0=args.r0_500*(args.lam/500.)**(6./5),
-                                        diam=args.diam, obscuration=args.obscuration,
-                                       kcrit=kcrit)
-        secondKickImg = secondKick.drawImage(nx=args.nx, ny=args.nx, scale=args.scale,
-                                             method='phot', n_photons=args.nphot)
-
-        try:
-            fftMom = galsim.hsm.FindAdaptiveMom(fftImg)
-        except RuntimeError:
-            fftMom = None
-
-        try:
-            secondKickMom = galsim.hsm.FindAdaptiveMom(secondKickImg)
-        except RuntimeError:
-            secondKickMom = None
-
-        axes[0, icol].imshow(fftImg.array)
-        axes[1, icol].imshow(secondKickImg.array)
+    for icol, fftArr, secondKickArr, fftMom, secondKickMom in results:
+        axes[0, icol].imshow(fftArr, interpolation='nearest', origin='lower')
+        axes[1, icol].imshow(secondKickArr, interpolation='nearest', origin='lower')
 
         if fftMom is not None:
-            axes[0, icol].text(0.5, 0.9, "{:6.3f}".format(fftMom.moments_sigma),
+            axes[0, icol].text(0.5, 0.9, "{:6.3f}".format(fftMom),
                                transform=axes[0, icol].transAxes, color='w')
 
         if secondKickMom is not None:
-            axes[1, icol].text(0.5, 0.9, "{:6.3f}".format(secondKickMom.moments_sigma),
+            axes[1, icol].text(0.5, 0.9, "{:6.3f}".format(secondKickMom),
                                transform=axes[1, icol].transAxes, color='w')
-        axes[0, icol].set_title("{:4.2f}".format(kcrit))
+        axes[0, icol].set_title("{:4.2f}".format(kcrits[icol]))
 
     axes[0, 0].set_ylabel("FFT")
     axes[1, 0].set_ylabel("2nd kick")
@@ -164,9 +719,9 @@ def make_plot(args):
     fig.tight_layout()
 
     dirname, filename = os.path.split(args.outfile)
-    if not os.path.exists(dirname):
-        os.mkdir(dirname)
-    fig.savefig(args.outfile)
+    if dirname:
+        os.makedirs(dirname, exist_ok=True)
+    fig.savefig(args.outfile, dpi=100)
 
 
 if __name__ == '__main__':
@@ -193,14 +748,31 @@ if __name__ == '__main__':
                              "with periodic boundary conditions.  Default: 102.4")
     parser.add_argument("--screen_scale", type=float, default=0.0125,
                         help="Resolution of atmospheric screen in meters.  Default: 0.0125")
+    parser.add_argument("--double_screens", action='store_true',
+                        help="Keep the Fourier transformed screens in double precision instead "
+                             "of single precision, at twice the memory.  Single precision changes "
+                             "the measured PSF sizes by less than 1e-6 pixels.")
+    parser.add_argument("--cache_dir", type=str, default="",
+                        help="Directory in which to cache Fourier transformed screens between "
+                             "runs (several GB for each set of parameters, which are never "
+                             "cleaned up).  Default: '', i.e., no caching")
+    parser.add_argument("--max_memory", type=float, default=4.0,
+                        help="Maximum memory in GB for the filtered screens when drawing the "
+                             "Fourier optics PSFs with numba.  If the screens for every kcrit "
+                             "don't fit, they are drawn a few kcrits at a time.  Default: 4.0")
     parser.add_argument("--max_speed", type=float, default=20.0,
                         help="Maximum wind speed in m/s.  Default: 20.0")
     parser.add_argument("--kmin", type=float, default=0.05,
                         help="Minimum kcrit to plot.  Default: 0.05")
     parser.add_argument("--kmax", type=float, default=0.5,
                         help="Maximum kcrit to plot.  Default: 0.5")
+    parser.add_argument("--method", type=str, default='fft', choices=['fft', 'phot'],
+                        help="Method to use to draw the second kick PSF.  Default: fft")
     parser.add_argument("--nphot", type=int, default=int(3e6),
-                        help="Number of photons to shoot.  Default: 3e6")
+                        help="Number of photons to shoot with --method phot.  Default: 3e6")
+    parser.add_argument("--nchunk", type=int, default=10,
+                        help="Number of chunks in which to shoot photons with --method phot.  "
+                             "Default: 10")
 
     parser.add_argument("--lam", type=float, default=700.0,
                         help="Wavelength in nanometers.  Default: 700.0")
@@ -233,8 +233,10 @@ class AtmosphericScreen(object):
     def _init_psi(self):
         """Assemble 2D von Karman sqrt power spectrum.
         """
-        fx = np.fft.fftfreq(self.npix, self.screen_scale)
-        fx, fy = np.meshgrid(fx, fx)
+        # The screens are real, so we only need the non-negative x frequencies of an rfft2.
+        fx = np.fft.rfftfreq(self.npix, self.screen_scale)
+        fy = np.fft.fftfreq(self.npix, self.screen_scale)
+        fx, fy = np.meshgrid(fx, fy)
         # Faster to avoid as many temporary arrays as possible.  This is just ksq = fx**2 + fy**2.
         ksq = fx
         ksq[:,:] *= fx
@@ -259,8 +261,8 @@ class AtmosphericScreen(object):
     def _random_screen(self):
         """Generate a random phase screen with power spectrum given by self._psi**2"""
         gd = GaussianDeviate(self.rng)
-        noise = utilities.rand_arr(self._psi.shape, gd)
-        return fft.ifft2(fft.fft2(noise)*self._psi).real
+        noise = utilities.rand_arr((self.npix, self.npix), gd)
+        return fft.irfft2(fft.rfft2(noise)*self._psi)
 
     def _seek(self, t):
         """Set layer's internal clock to time t."""
@@ -155,6 +155,55 @@ def test_structure_function():
                     err_msg="Simulated structure function not close to prediction.")
 
 
+@timer
+def test_random_screen():
+    """Test that AtmosphericScreen's half-plane (rfft2) screen generation matches the full complex
+    FFT version.
+    """
+    screen_size = 10.0
+    screen_scale = 0.1
+    r0_500 = 0.2
+    L0 = 25.0
+
+    # Full, kmin/kmax truncated, and boiling screens.
+    for kmin, kmax, alpha, time_step in [(0.0, np.inf, 1.0, None), (0.5, 3.0, 1.0, None),
+                                         (0.0, np.inf, 0.9, 0.1)]:
+        screen = galsim.AtmosphericScreen(screen_size=screen_size, screen_scale=screen_scale,
+                                          r0_500=r0_500, L0=L0, alpha=alpha, time_step=time_step,
+                                          rng=galsim.BaseDeviate(1234))
+        screen.instantiate(kmin=kmin, kmax=kmax)
+        npix = screen.npix
+
+        # Assemble the von Karman sqrt power spectrum over the full plane of frequencies.
+        fx = np.fft.fftfreq(npix, screen.screen_scale)
+        ksq = fx[:, np.newaxis]**2 + fx**2
+        psi = ((ksq + 1./L0**2)**(-11./12.) * screen._kolmogorov_constant * r0_500**(-5./6.) *
+               npix * 500. / screen.screen_size)
+        psi[0, 0] = 0.0
+        psi[(ksq < kmin**2) | (ksq > kmax**2)] = 0.0
+
+        # The instantiated screen is drawn using a copy of the original rng.
+        noise = galsim.utilities.rand_arr(
+                (npix, npix), galsim.GaussianDeviate(screen._orig_rng.duplicate()))
+        expected = np.fft.ifft2(np.fft.fft2(noise)*psi).real
+        np.testing.assert_allclose(
+                screen._tab2d.getVals()[:-1, :-1], expected, rtol=0,
+                atol=1.e-10*np.max(np.abs(expected)),
+                err_msg="Instantiated screen doesn't match full FFT version.")
+
+        if alpha != 1.0:
+            # Boiling screens keep _psi around for subsequent updates.
+            np.testing.assert_allclose(screen._psi, psi[:, :npix//2+1], rtol=1.e-12,
+                                       err_msg="Half-plane _psi doesn't match full plane psi.")
+            noise = galsim.utilities.rand_arr(
+                    (npix, npix), galsim.GaussianDeviate(screen.rng.duplicate()))
+            expected = np.fft.ifft2(np.fft.fft2(noise)*psi).real
+            np.testing.assert_allclose(
+                    screen._random_screen(), expected, rtol=0,
+                    atol=1.e-10*np.max(np.abs(expected)),
+                    err_msg="Boiling screen update doesn't match full FFT version.")
+
+
 @timer
 def test_phase_screen_list():
     """Test list-like behaviors of PhaseScreenList."""
@@ -989,6 +1038,7 @@ if __name__ == "__main__":
     test_aperture()
     test_atm_screen_size()
     test_structure_function()
+    test_random_screen()
     test_phase_screen_list()
     test_frozen_flow()
     test_phase_psf_reset()